@@ -37,13 +37,14 @@ Write-Host "`nStep 2: Counting output files..." -ForegroundColor Yellow
 
 $plyFiles = (Get-ChildItem -Path "outputs" -Filter "*.ply" -Recurse -ErrorAction SilentlyContinue).Count
 $pngFiles = (Get-ChildItem -Path "outputs" -Filter "*.png" -Recurse -ErrorAction SilentlyContinue).Count
-$npzFiles = (Get-ChildItem -Path "outputs" -Filter "*.npz" -Recurse -ErrorAction SilentlyContinue).Count
+# older runs wrote compressed .npz, current mesh_preprocess.py writes .npy
+$npyFiles = (Get-ChildItem -Path "outputs" -Include "*.npy","*.npz" -Recurse -ErrorAction SilentlyContinue).Count
 $txtFiles = (Get-ChildItem -Path "outputs" -Filter "summary.txt" -Recurse -ErrorAction SilentlyContinue).Count
 $csvFiles = (Get-ChildItem -Path "outputs" -Filter "*.csv" -Recurse -ErrorAction SilentlyContinue).Count
 
 Write-Host "  Reconstructed meshes (.ply): $plyFiles (expected: 16)" -ForegroundColor $(if ($plyFiles -eq 16) {"Green"} else {"Yellow"})
 Write-Host "  Visualizations (.png): $pngFiles (expected: 50)" -ForegroundColor $(if ($pngFiles -ge 48) {"Green"} else {"Yellow"})
-Write-Host "  Quantized data (.npz): $npzFiles (expected: 16+)" -ForegroundColor $(if ($npzFiles -ge 16) {"Green"} else {"Yellow"})
+Write-Host "  Quantized data (.npy/.npz): $npyFiles (expected: 16+)" -ForegroundColor $(if ($npyFiles -ge 16) {"Green"} else {"Yellow"})
 Write-Host "  Summary files (.txt): $txtFiles (expected: 16)" -ForegroundColor $(if ($txtFiles -eq 16) {"Green"} else {"Yellow"})
 Write-Host "  Aggregate CSV: $csvFiles (expected: 1)" -ForegroundColor $(if ($csvFiles -ge 1) {"Green"} else {"Yellow"})
 
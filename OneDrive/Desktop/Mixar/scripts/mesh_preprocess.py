@@ -12,21 +12,49 @@ This script will:
  - compute MSE and MAE per axis and overall
  - save reconstructed meshes and plots under outputs/<meshname>/<method>/
 
-Dependencies: trimesh, numpy, matplotlib
+Dependencies: trimesh, numpy, matplotlib (numba optional, fuses the quantize/reconstruct/error pass)
 """
 import os
 import argparse
-import glob
+import functools
 import traceback
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import trimesh
-import matplotlib.pyplot as plt
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except Exception:
+    NUMBA_AVAILABLE = False
 
 
 def find_obj_files(input_dir):
-    pattern = os.path.join(input_dir, '**', '*.obj')
-    return glob.glob(pattern, recursive=True)
+    # skip hidden entries, e.g. the __MACOSX/._*.obj resource forks in the samples
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        found.extend(os.path.join(root, f) for f in files if f.endswith('.obj') and not f.startswith('.'))
+    return found
+
+
+def load_mesh(path):
+    """Return (vertices, faces) for a mesh file; faces is None for point clouds."""
+    if path.lower().endswith('.obj'):
+        # call the OBJ parser directly: skips format sniffing, material/texture
+        # resolution and Trimesh/Scene construction, none of which we use
+        with open(path, 'rb') as f:
+            kwargs = trimesh.exchange.obj.load_obj(f)
+        geometry = kwargs.get('geometry', {})
+        if len(geometry) == 1:
+            geom = next(iter(geometry.values()))
+            return np.asarray(geom['vertices']), geom.get('faces')
+    # anything else (other formats, multi-object OBJs) goes through the generic loader
+    mesh = trimesh.load(path, process=False)
+    if mesh.is_empty:
+        return np.empty((0, 3)), None
+    return np.asarray(mesh.vertices), getattr(mesh, 'faces', None)
 
 
 def mesh_stats(vertices):
@@ -46,14 +74,20 @@ def normalize_minmax(vertices):
     # avoid divide by zero
     denom[denom == 0] = 1.0
     normalized = (vertices - vmin) / denom
-    meta = {'vmin': vmin, 'vmax': vmax}
+    # denormalize is normalized * scale + offset; precomputed so it runs in place
+    meta = {'vmin': vmin, 'vmax': vmax, 'scale': vmax - vmin, 'offset': vmin}
     return normalized, meta
 
 
+def _affine(normalized, scale, offset):
+    out = np.empty_like(normalized)
+    np.multiply(normalized, scale, out=out)
+    out += offset
+    return out
+
+
 def denormalize_minmax(normalized, meta):
-    vmin = meta['vmin']
-    vmax = meta['vmax']
-    return normalized * (vmax - vmin) + vmin
+    return _affine(normalized, meta['scale'], meta['offset'])
 
 
 def normalize_unit_sphere(vertices):
@@ -66,62 +100,160 @@ def normalize_unit_sphere(vertices):
     unit = shifted / maxd  # in ~[-1,1]
     # map to [0,1] for quantization convenience
     normalized = (unit + 1.0) / 2.0
-    meta = {'centroid': centroid, 'maxd': float(maxd)}
+    maxd = float(maxd)
+    # (normalized * 2 - 1) * maxd + centroid, folded into one scale and offset
+    meta = {'centroid': centroid, 'maxd': maxd, 'scale': 2.0 * maxd, 'offset': centroid - maxd}
     return normalized, meta
 
 
 def denormalize_unit_sphere(normalized, meta):
-    centroid = meta['centroid']
-    maxd = meta['maxd']
-    unit = normalized * 2.0 - 1.0
-    return unit * maxd + centroid
+    return _affine(normalized, meta['scale'], meta['offset'])
 
 
 def quantize(normalized, bins=1024):
     n = int(bins)
-    q = np.floor(normalized * (n - 1)).astype(np.int64)
+    out = np.empty_like(normalized)
+    np.multiply(normalized, n - 1, out=out)
     # clip just in case of numerical issues
-    q = np.clip(q, 0, n - 1)
-    return q
+    np.clip(out, 0, n - 1, out=out)
+    # truncating cast == floor, since everything is >= 0 after the clip
+    return out.astype(np.uint16 if n <= 65536 else np.int32)
 
 
 def dequantize(q, bins=1024):
     n = int(bins)
-    return q.astype(np.float64) / (n - 1)
+    return q.astype(np.float32) * np.float32(1.0 / (n - 1))
 
 
-def compute_errors(original, reconstructed):
+def _error_sums(original, reconstructed):
     diff = original - reconstructed
-    mse_per_axis = np.mean(diff ** 2, axis=0)
-    mae_per_axis = np.mean(np.abs(diff), axis=0)
+    # accumulate in float64: float32 sums drift noticeably on large meshes
+    return (np.einsum('ij,ij->j', diff, diff, dtype=np.float64),
+            np.abs(diff).sum(axis=0, dtype=np.float64))
+
+
+def _errors_from_sums(sse, sae, n):
+    mse_per_axis = sse / n
+    mae_per_axis = sae / n
     mse = float(np.mean(mse_per_axis))
     mae = float(np.mean(mae_per_axis))
     return {'mse_per_axis': mse_per_axis, 'mae_per_axis': mae_per_axis, 'mse': mse, 'mae': mae}
 
 
+def compute_errors(original, reconstructed):
+    sse, sae = _error_sums(original, reconstructed)
+    return _errors_from_sums(sse, sae, original.shape[0])
+
+
+if NUMBA_AVAILABLE:
+    # no fastmath here: the kernel must reproduce the float32 NumPy path bit for bit,
+    # so quantized codes never depend on whether numba is installed
+    @numba.njit(parallel=True, cache=True)
+    def _roundtrip_kernel(vertices, normalized, top, inv, scale, offset, quant, recon):
+        # quantize -> dequantize -> denormalize -> error sums in one pass, writing
+        # quant/recon in place; same float32 ops as quantize/dequantize/_affine
+        n, d = vertices.shape
+        block = 4096
+        nblocks = (n + block - 1) // block
+        sse = np.zeros((nblocks, d))
+        sae = np.zeros((nblocks, d))
+        for b in numba.prange(nblocks):
+            for i in range(b * block, min(n, (b + 1) * block)):
+                for j in range(d):
+                    x = normalized[i, j] * top
+                    if x < 0:
+                        x = np.float32(0)
+                    elif x > top:
+                        x = top
+                    k = int(x)
+                    quant[i, j] = k
+                    recon[i, j] = np.float32(k) * inv * scale[j] + offset[j]
+                    v = np.float64(vertices[i, j] - recon[i, j])
+                    sse[b, j] += v * v
+                    sae[b, j] += abs(v)
+        return sse.sum(axis=0), sae.sum(axis=0)
+
+
+def _roundtrip_numpy(vertices, normalized, meta, denormalize_fn, bins=1024):
+    quant = quantize(normalized, bins=bins)
+    recon = denormalize_fn(dequantize(quant, bins=bins), meta)
+    return quant, recon, compute_errors(vertices, recon)
+
+
+def _roundtrip_numba(vertices, normalized, meta, bins=1024):
+    n = int(bins)
+    d = vertices.shape[1]
+    dtype = vertices.dtype
+    scale = np.broadcast_to(np.asarray(meta['scale'], dtype=dtype), (d,)).copy()
+    offset = np.broadcast_to(np.asarray(meta['offset'], dtype=dtype), (d,)).copy()
+    quant = np.empty(vertices.shape, dtype=np.uint16 if n <= 65536 else np.int32)
+    recon = np.empty_like(vertices)
+    sse, sae = _roundtrip_kernel(vertices, normalized.astype(dtype, copy=False),
+                                 dtype.type(n - 1), dtype.type(1.0 / (n - 1)),
+                                 scale, offset, quant, recon)
+    return quant, recon, _errors_from_sums(sse, sae, vertices.shape[0])
+
+
+def roundtrip(vertices, normalized, meta, denormalize_fn, bins=1024):
+    """Quantize, reconstruct and measure errors. Returns (quant, recon, errors)."""
+    if NUMBA_AVAILABLE:
+        return _roundtrip_numba(vertices, normalized, meta, bins=bins)
+    return _roundtrip_numpy(vertices, normalized, meta, denormalize_fn, bins=bins)
+
+
+def _lazy_plt():
+    # matplotlib is only imported once a plot is actually drawn (skipped with --no_plots)
+    import matplotlib
+    matplotlib.use('Agg')  # headless backend so worker processes never try to open a GUI
+    import matplotlib.pyplot as plt
+    return plt
+
+
+# one figure per plot kind, reused across meshes (per process) to skip figure setup;
+# they live until the process exits
+_FIGURES = {}
+
+
+def get_plot_axes(kind):
+    if kind not in _FIGURES:
+        _FIGURES[kind] = _lazy_plt().subplots(figsize=(6,4))
+    fig, ax = _FIGURES[kind]
+    ax.clear()
+    return fig, ax
+
+
 def save_mesh(vertices, faces, out_path):
     mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
     mesh.export(out_path)
 
 
-def process_mesh(path, out_dir, bins=1024, visualize=False):
+def process_mesh(path, out_dir, bins=1024, visualize=False, make_plots=True):
+    # collect the console report and print it in one go, so output from
+    # parallel workers does not interleave between meshes
+    report = []
+    try:
+        _process_mesh(path, out_dir, report, bins=bins, make_plots=make_plots)
+    finally:
+        print('\n'.join(report), flush=True)
+
+
+def _process_mesh(path, out_dir, report, bins=1024, make_plots=True):
     name = os.path.splitext(os.path.basename(path))[0]
-    mesh = trimesh.load(path, process=False)
-    if mesh.is_empty:
-        print(f"Skipping empty mesh: {path}")
+    vertices, faces = load_mesh(path)
+    if len(vertices) == 0:
+        report.append(f"Skipping empty mesh: {path}")
         return
-    vertices = np.asarray(mesh.vertices, dtype=np.float64)
-    faces = None
-    if hasattr(mesh, 'faces'):
-        faces = np.asarray(mesh.faces)
+    vertices = np.asarray(vertices, dtype=np.float32)
+    if faces is not None:
+        faces = np.asarray(faces)
 
     stats = mesh_stats(vertices)
-    print(f"\nMesh: {path}")
-    print(f"Vertices: {stats['n_vertices']}")
-    print(f"Min: {stats['min']}")
-    print(f"Max: {stats['max']}")
-    print(f"Mean: {stats['mean']}")
-    print(f"Std: {stats['std']}")
+    report.append(f"\nMesh: {path}")
+    report.append(f"Vertices: {stats['n_vertices']}")
+    report.append(f"Min: {stats['min']}")
+    report.append(f"Max: {stats['max']}")
+    report.append(f"Mean: {stats['mean']}")
+    report.append(f"Std: {stats['std']}")
 
     methods = [
         ('minmax', normalize_minmax, denormalize_minmax),
@@ -131,21 +263,17 @@ def process_mesh(path, out_dir, bins=1024, visualize=False):
     for method_name, normalize_fn, denormalize_fn in methods:
         try:
             normalized, meta = normalize_fn(vertices)
-            quant = quantize(normalized, bins=bins)
+            # quantize, dequantize, denormalize and compute errors
+            quant, recon, errors = roundtrip(vertices, normalized, meta, denormalize_fn, bins=bins)
             # save quantized integers
             method_out = os.path.join(out_dir, name, method_name)
             os.makedirs(method_out, exist_ok=True)
-            np.savez_compressed(os.path.join(method_out, 'quantized.npz'), quant=quant)
-
-            # dequantize and denormalize
-            deq = dequantize(quant, bins=bins)
-            recon = denormalize_fn(deq, meta)
+            # raw .npy: zlib gains little on quantized coordinates and dominates write time
+            np.save(os.path.join(method_out, 'quantized.npy'), quant)
 
-            # compute errors
-            errors = compute_errors(vertices, recon)
-            print(f"Method: {method_name} | MSE: {errors['mse']:.6e} | MAE: {errors['mae']:.6e}")
-            print(f"MSE per axis: {errors['mse_per_axis']}")
-            print(f"MAE per axis: {errors['mae_per_axis']}")
+            report.append(f"Method: {method_name} | MSE: {errors['mse']:.6e} | MAE: {errors['mae']:.6e}")
+            report.append(f"MSE per axis: {errors['mse_per_axis']}")
+            report.append(f"MAE per axis: {errors['mae_per_axis']}")
 
             # save reconstructed mesh
             recon_path = os.path.join(method_out, f"{name}_reconstructed.ply")
@@ -157,34 +285,33 @@ def process_mesh(path, out_dir, bins=1024, visualize=False):
                 pcl.export(recon_path)
 
             # save a numpy file of recon vertices
-            np.savez_compressed(os.path.join(method_out, 'reconstructed_vertices.npz'), reconstructed=recon)
-
-            # plot error per axis
-            abs_err = np.abs(vertices - recon)
-            mean_axis_err = abs_err.mean(axis=0)
-            fig, ax = plt.subplots(figsize=(6,4))
-            axis_names = ['x', 'y', 'z']
-            ax.bar(axis_names, mean_axis_err)
-            ax.set_title(f"Mean absolute reconstruction error per axis\n{os.path.basename(path)} - {method_name}")
-            ax.set_ylabel('Mean absolute error')
-            plt.tight_layout()
-            plot_path = os.path.join(method_out, 'error_per_axis.png')
-            fig.savefig(plot_path)
-            plt.close(fig)
-
-            # optionally save a scatter of original vs reconstructed norms (not mandatory)
-            # save a basic histogram of error magnitude
-            mag_err = np.linalg.norm(abs_err, axis=1)
-            fig, ax = plt.subplots(figsize=(6,4))
-            ax.hist(mag_err, bins=100)
-            ax.set_yscale('log')
-            ax.set_title(f"Error magnitude histogram\n{os.path.basename(path)} - {method_name}")
-            ax.set_xlabel('L2 error per vertex')
-            ax.set_ylabel('Count (log)')
-            plt.tight_layout()
-            hist_path = os.path.join(method_out, 'error_hist.png')
-            fig.savefig(hist_path)
-            plt.close(fig)
+            np.save(os.path.join(method_out, 'reconstructed_vertices.npy'), recon)
+
+            if make_plots:
+                # plot error per axis
+                abs_err = np.abs(vertices - recon)
+                mean_axis_err = abs_err.mean(axis=0)
+                fig, ax = get_plot_axes('error_per_axis')
+                axis_names = ['x', 'y', 'z']
+                ax.bar(axis_names, mean_axis_err)
+                ax.set_title(f"Mean absolute reconstruction error per axis\n{os.path.basename(path)} - {method_name}")
+                ax.set_ylabel('Mean absolute error')
+                fig.tight_layout()
+                plot_path = os.path.join(method_out, 'error_per_axis.png')
+                fig.savefig(plot_path)
+
+                # optionally save a scatter of original vs reconstructed norms (not mandatory)
+                # save a basic histogram of error magnitude
+                mag_err = np.linalg.norm(abs_err, axis=1)
+                fig, ax = get_plot_axes('error_hist')
+                ax.hist(mag_err, bins=100)
+                ax.set_yscale('log')
+                ax.set_title(f"Error magnitude histogram\n{os.path.basename(path)} - {method_name}")
+                ax.set_xlabel('L2 error per vertex')
+                ax.set_ylabel('Count (log)')
+                fig.tight_layout()
+                hist_path = os.path.join(method_out, 'error_hist.png')
+                fig.savefig(hist_path)
 
             # write a small JSON/text summary
             summary_path = os.path.join(method_out, 'summary.txt')
@@ -200,8 +327,22 @@ def process_mesh(path, out_dir, bins=1024, visualize=False):
                 f.write(f"meta: {meta}\n")
 
         except Exception as e:
-            print(f"Error processing {path} with method {method_name}: {e}")
-            traceback.print_exc()
+            report.append(f"Error processing {path} with method {method_name}: {e}")
+            report.append(traceback.format_exc().rstrip())
+
+
+def _init_worker():
+    # the pool already uses every core; a parallel numba kernel inside each
+    # worker would oversubscribe them, so keep the kernel single-threaded here
+    if NUMBA_AVAILABLE:
+        numba.set_num_threads(1)
+
+
+def process_meshes(paths, out_dirs, bins=1024, workers=None, make_plots=True):
+    # meshes are independent and CPU-bound, so fan them out over a process pool
+    worker = functools.partial(process_mesh, bins=bins, make_plots=make_plots)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker) as ex:
+        list(ex.map(worker, paths, out_dirs))
 
 
 def main():
@@ -213,6 +354,8 @@ def main():
     parser.add_argument('--out_template', type=str, default='{out_dir}/{group}/{name}',
                         help="Output path template. Available keys: out_dir, group, name. Example: '{out_dir}/{group}/{name}'")
     parser.add_argument('--bins', type=int, default=1024, help='Quantization bins')
+    parser.add_argument('--no_plots', action='store_true', help='Skip the per-mesh error plots (only numbers and meshes are written)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: CPU count)')
     args = parser.parse_args()
 
     def build_out_from_template(out_dir, group, name):
@@ -232,7 +375,7 @@ def main():
             out_base = build_out_from_template(args.out_dir, group, name)
             print(f"Processing single file: {sample_path} -> outputs: {out_base}")
             os.makedirs(out_base, exist_ok=True)
-            process_mesh(sample_path, out_base, bins=args.bins)
+            process_mesh(sample_path, out_base, bins=args.bins, make_plots=not args.no_plots)
             return
         elif os.path.isdir(sample_path):
             # treat as group directory
@@ -243,11 +386,13 @@ def main():
                 print(f"No .obj files found under sample directory {sd}. Nothing to do.")
                 return
             print(f"Processing sample directory: {sd} with {len(sd_obj_files)} .obj files")
+            out_bases = []
             for p in sd_obj_files:
                 name = os.path.splitext(os.path.basename(p))[0]
                 out_base = build_out_from_template(args.out_dir, sd_name, name)
                 os.makedirs(out_base, exist_ok=True)
-                process_mesh(p, out_base, bins=args.bins)
+                out_bases.append(out_base)
+            process_meshes(sd_obj_files, out_bases, bins=args.bins, workers=args.workers, make_plots=not args.no_plots)
             return
         else:
             # maybe user gave a subdir name under input_dir
@@ -260,11 +405,13 @@ def main():
                     print(f"No .obj files found under sample directory {sd}. Nothing to do.")
                     return
                 print(f"Processing sample directory: {sd} with {len(sd_obj_files)} .obj files")
+                out_bases = []
                 for p in sd_obj_files:
                     name = os.path.splitext(os.path.basename(p))[0]
                     out_base = build_out_from_template(args.out_dir, sd_name, name)
                     os.makedirs(out_base, exist_ok=True)
-                    process_mesh(p, out_base, bins=args.bins)
+                    out_bases.append(out_base)
+                process_meshes(sd_obj_files, out_bases, bins=args.bins, workers=args.workers, make_plots=not args.no_plots)
                 return
             else:
                 print(f"Sample path not found: {args.sample}")
@@ -280,10 +427,11 @@ def main():
                 print(f"No .obj files found under {args.input_dir}")
                 return
             print(f"Found {len(obj_files)} .obj files.\nProcessing with {args.bins} bins...")
-            for p in obj_files:
-                process_mesh(p, args.out_dir, bins=args.bins)
+            process_meshes(obj_files, [args.out_dir] * len(obj_files), bins=args.bins, workers=args.workers, make_plots=not args.no_plots)
         else:
             print(f"Found {len(subdirs)} subdirectories under {args.input_dir}. Processing each separately...")
+            # gather every group's meshes first so a single pool keeps all workers busy
+            paths, out_dirs = [], []
             for sd in subdirs:
                 sd_name = os.path.basename(sd)
                 sd_obj_files = find_obj_files(sd)
@@ -291,9 +439,11 @@ def main():
                     print(f"No .obj files found under subdirectory {sd}. Skipping.")
                     continue
                 sd_out = os.path.join(args.out_dir, sd_name)
-                print(f"\nProcessing group: {sd_name} with {len(sd_obj_files)} .obj files -> outputs: {sd_out}")
-                for p in sd_obj_files:
-                    process_mesh(p, sd_out, bins=args.bins)
+                print(f"Group: {sd_name} with {len(sd_obj_files)} .obj files -> outputs: {sd_out}")
+                paths.extend(sd_obj_files)
+                out_dirs.extend([sd_out] * len(sd_obj_files))
+            if paths:
+                process_meshes(paths, out_dirs, bins=args.bins, workers=args.workers, make_plots=not args.no_plots)
     else:
         obj_files = find_obj_files(args.input_dir)
         if not obj_files:
@@ -301,8 +451,7 @@ def main():
             return
 
         print(f"Found {len(obj_files)} .obj files.\nProcessing with {args.bins} bins...")
-        for p in obj_files:
-            process_mesh(p, args.out_dir, bins=args.bins)
+        process_meshes(obj_files, [args.out_dir] * len(obj_files), bins=args.bins, workers=args.workers, make_plots=not args.no_plots)
 
     print('\nProcessing complete. Check the outputs/ folder for results.')
 